@@ -1,14 +1,72 @@
 import re
-import json
+import functools
+
+
+# ── Detection markers ─────────────────────────────────────────
+# Each detector checks its own markers with short-circuiting any(), so a repo
+# only pays for the checks its language actually reaches.
+PYTHON_MARKERS = ("requirements.txt", "setup.py", ".py", "pyproject.toml")
+NODE_MARKERS = ("package.json", "yarn.lock", ".js", ".ts")  # also covers .jsx / .tsx
+
+# (framework, keywords, markers, weight): the weight is added once if any keyword
+# is in the lower-cased content or any marker is in the content verbatim
+PYTHON_FRAMEWORK_WEIGHTS = (
+    ("fastapi",   ("fastapi",),   ("APIRouter",),  10),
+    ("fastapi",   ("uvicorn",),   (),              8),
+    ("django",    ("django",),    ("manage.py",),  12),
+    ("flask",     ("flask",),     ("@app.route",), 10),
+    ("streamlit", ("streamlit",), ("st.title",),   15),
+)
+
+FALLBACK_PORT = 8000
+DEFAULT_PORTS = {
+    "fastapi": 8000, "django": 8000,
+    "flask": 5000,
+    "streamlit": 8501,
+    "nextjs": 3000, "express": 3000,
+}
+
+APP_TYPES = {
+    "fastapi": "web", "flask": "web", "django": "web", "express": "web", "nextjs": "web",
+    "streamlit": "streamlit",
+}
+
+# Entry-point candidates in priority order. Polyglot and unknown repos use the
+# nodejs profile.
+LANGUAGE_PROFILES = {
+    "python": {
+        "main_files": ("streamlit_app.py", "main.py", "app.py", "run.py", "manage.py", "wsgi.py", "asgi.py"),
+        "main_file_exts": (".py",),
+        "default_main": "app.py",
+        "package_manager": "pip",
+    },
+    "nodejs": {
+        "main_files": ("index.js", "server.js", "app.js", "index.ts", "main.js"),
+        "main_file_exts": (".js", ".ts"),
+        "default_main": "index.js",
+        "package_manager": "npm",
+    },
+}
+
+# Tried in order against the lower-cased content; the first pattern that matches
+# anywhere wins. Literals are written lower-case instead of compiling with
+# re.IGNORECASE, which would turn off re's fast literal-prefix scan.
+PORT_PATTERNS = tuple(re.compile(p) for p in (
+    r"port\s*[=:]\s*(\d{2,5})",
+    r"os\.environ\.get\(['\"]port['\"][^,]*,\s*(\d{2,5})",
+    r"getenv\(['\"]port['\"][^,]*,\s*['\"](\d{2,5})['\"]\)",
+))
 
 
 class RepositoryAnalyzer:
+    __slots__ = ()  # stateless: all rules live in module-level tables
+
     def analyze_repository(self, repo_content: str) -> dict:
         content_lower = repo_content.lower()
 
         # ── Language ────────────────────────────────────────────────
-        has_python = any(f in repo_content for f in ["requirements.txt", "setup.py", ".py", "pyproject.toml"])
-        has_node   = any(f in repo_content for f in ["package.json", "yarn.lock", ".js", ".ts", ".jsx", ".tsx"])
+        has_python = any(m in repo_content for m in PYTHON_MARKERS)
+        has_node   = any(m in repo_content for m in NODE_MARKERS)
 
         if has_python and not has_node:
             lang = "python"
@@ -24,11 +82,9 @@ class RepositoryAnalyzer:
 
         if lang == "python":
             scores = {"fastapi":0, "flask":0, "django":0, "streamlit":0}
-            if "fastapi" in content_lower or "APIRouter" in repo_content: scores["fastapi"] += 10
-            if "uvicorn" in content_lower: scores["fastapi"] += 8
-            if "django" in content_lower or "manage.py" in repo_content: scores["django"] += 12
-            if "flask" in content_lower or "@app.route" in repo_content: scores["flask"] += 10
-            if "streamlit" in content_lower or "st.title" in repo_content: scores["streamlit"] += 15
+            for fw, keywords, markers, weight in PYTHON_FRAMEWORK_WEIGHTS:
+                if any(k in content_lower for k in keywords) or any(m in repo_content for m in markers):
+                    scores[fw] += weight
 
             max_score = max(scores.values())
             if max_score >= 8:
@@ -46,46 +102,29 @@ class RepositoryAnalyzer:
 
         # ── Port ─────────────────────────────────────────────────────
         port = None
-        port_patterns = [
-            r"port\s*[=:]\s*(\d{2,5})",
-            r"PORT\s*[=:]\s*(\d{2,5})",
-            r"os\.environ\.get\(['\"]PORT['\"][^,]*,\s*(\d{2,5})",
-            r"getenv\(['\"]PORT['\"][^,]*,\s*['\"](\d{2,5})['\"]\)",
-            r"app\.run\([^)]*port\s*[=:]\s*(\d{2,5})",
-        ]
-        for pat in port_patterns:
-            m = re.search(pat, content_lower)
+        for pat in PORT_PATTERNS:
+            m = pat.search(content_lower)
             if m:
                 port = int(m.group(1))
                 break
 
         if port is None:
-            if framework in ("fastapi", "django"):   port = 8000
-            elif framework in ("flask",):            port = 5000
-            elif framework == "streamlit":           port = 8501
-            elif framework in ("nextjs", "express"): port = 3000
-            else:                                    port = 8000
+            port = DEFAULT_PORTS.get(framework, FALLBACK_PORT)
 
         if not (1 <= port <= 65535):
-            port = 8000
+            port = FALLBACK_PORT
 
         # ── Main file ────────────────────────────────────────────────
-        if lang == "python":
-            main_file = "app.py"
-            candidates = ["streamlit_app.py","main.py", "app.py", "run.py", "manage.py", "wsgi.py", "asgi.py"]
-            for c in candidates:
-                if c in repo_content:
-                    main_file = c
-                    break
-            if framework == "django" and "manage.py" in repo_content:
-                main_file = "manage.py"
-        else:
-            main_file = "index.js"
-            candidates = ["index.js", "server.js", "app.js", "index.ts", "main.js"]
-            for c in candidates:
+        profile = LANGUAGE_PROFILES.get(lang, LANGUAGE_PROFILES["nodejs"])
+        main_file = profile["default_main"]
+        # Candidates all end in an extension marker; without one none can be present
+        if any(ext in repo_content for ext in profile["main_file_exts"]):
+            for c in profile["main_files"]:
                 if c in repo_content:
                     main_file = c
                     break
+        if framework == "django" and "manage.py" in repo_content:
+            main_file = "manage.py"
 
         # ── Result ───────────────────────────────────────────────────
         result = {
@@ -93,16 +132,17 @@ class RepositoryAnalyzer:
             "framework": framework,
             "port": port,
             "main_file": main_file,
-            "package_manager": "pip" if "python" in lang else "npm",
-            "app_type": (
-                "web"       if framework in ("fastapi","flask","django","express","nextjs") else
-                "streamlit" if framework == "streamlit" else
-                "unknown"
-            )
+            "package_manager": profile["package_manager"],
+            "app_type": APP_TYPES.get(framework, "unknown"),
         }
 
         return result
 
 
-def analyze_repository(repo_content: str) -> str:
-    return json.dumps(RepositoryAnalyzer().analyze_repository(repo_content), indent=2)
\ No newline at end of file
+@functools.lru_cache(maxsize=1)
+def _get_analyzer() -> RepositoryAnalyzer:
+    return RepositoryAnalyzer()
+
+
+def analyze_repository(repo_content: str) -> dict:
+    return _get_analyzer().analyze_repository(repo_content)
\ No newline at end of file
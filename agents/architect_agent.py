@@ -1,12 +1,91 @@
 import os
+import copy
 import json
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
+import time
+import functools
+import threading
+from pydantic import BaseModel, ConfigDict
+
+
+# Safe default when the LLM is unreachable or answers with something unusable
+FALLBACK_RECOMMENDATION = {
+    "platform": "docker-single-container",
+    "base_image": "python:3.11-slim",
+    "resources": {"cpu": "0.5", "memory": "1G"},
+}
+FALLBACK_NOTES_PREFIX = "Error in architect recommendation"
+# Conservative per-framework fallbacks for when Groq is down
+FALLBACK_BASE_IMAGES = {"python": "python:3.11-slim", "nodejs": "node:20-alpine"}
+FALLBACK_RESOURCES = {
+    "django": {"cpu": "1", "memory": "1G"},
+    "streamlit": {"cpu": "1", "memory": "1G"},
+    "nextjs": {"cpu": "1", "memory": "1G"},
+    "fastapi": {"cpu": "0.5", "memory": "512M"},
+    "flask": {"cpu": "0.5", "memory": "512M"},
+    "express": {"cpu": "0.5", "memory": "512M"},
+}
+
+# After this many consecutive Groq failures, skip the LLM for the cooldown
+# and answer from fallbacks straight away. Once it is over, one trial call per
+# cooldown is let through until a call succeeds.
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_COOLDOWN_SECONDS = 60.0
+
+# Analysis fields a recommendation actually depends on. Analyses that only differ
+# elsewhere (port, main file spelling) reuse the same recommendation.
+SIMILARITY_FIELDS = ("language", "framework", "app_type")
+
+# Analyses whose answer is a known constant, answered without the LLM:
+# (language, frameworks, recommendation)
+RULE_RECOMMENDATIONS = (
+    ("python", ("flask", "fastapi"), {
+        "platform": "docker-single-container",
+        "base_image": "python:3.11-slim",
+        "resources": {"cpu": "0.5", "memory": "512M"},
+        "notes": "Single-process web API; a 2-4 USD/month VPS running the container is enough.",
+        "alternative": "railway",
+    }),
+)
+
+
+def _match_rules(analysis: dict) -> dict | None:
+    """Canonical recommendation for a common analysis, or None to ask the LLM."""
+    for language, frameworks, recommendation in RULE_RECOMMENDATIONS:
+        if analysis.get("language") == language and analysis.get("framework") in frameworks:
+            return copy.deepcopy(recommendation)
+    return None
+
+
+class ResourceSpec(BaseModel):
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    cpu: str
+    memory: str
+
+
+class ArchitectRecommendation(BaseModel):
+    """Schema the architect's JSON answer is validated against."""
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    platform: str
+    base_image: str
+    resources: ResourceSpec
+    notes: str
+    alternative: str | None = None
 
 
 class DeploymentArchitect:
     def __init__(self):
+        # LangChain/Groq imports are slow; pay for them only when an architect is built
+        from groq import GroqError
+        from langchain_groq import ChatGroq
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import JsonOutputParser, PydanticOutputParser
+
+        # API/network failures and unparseable answers (OutputParserException and
+        # ValidationError are ValueErrors) fall back; anything else is a bug and propagates
+        self._recoverable_errors = (GroqError, ValueError)
+
         self.llm = ChatGroq(
             model_name="llama-3.3-70b-versatile",
             groq_api_key=os.getenv("GROQ_API_KEY"),
@@ -14,12 +93,11 @@ class DeploymentArchitect:
         )
 
         self.prompt = ChatPromptTemplate.from_messages([
+            # The system prompt is fully static so providers can cache it as a prefix;
+            # the per-request analysis only appears in the trailing human turn.
             ("system", """You are a practical DevOps architect helping small edtech teams in Pakistan deploy on affordable infrastructure (VPS, shared hosting, Railway/Render/Fly.io style platforms).
 
-Given this analysis of the codebase:
-{analysis_json}
-
-Recommend the **most appropriate, low-cost, low-maintenance** deployment strategy.
+Given the analysis of a codebase in the user's message, recommend the **most appropriate, low-cost, low-maintenance** deployment strategy.
 
 Common realistic options for Karachi edtech context:
 - "docker-single-container"     → standard VPS (Hetzner, Contabo, DigitalOcean, local providers)
@@ -36,32 +114,184 @@ Rules:
 - Return **only** clean JSON. No markdown, no fences, no extra text.
 
 Example output structure:
-{
+{{
   "platform": "docker-single-container",
   "base_image": "python:3.11-slim",
-  "resources": {"cpu": "1.0", "memory": "1G"},
+  "resources": {{"cpu": "1.0", "memory": "1G"}},
   "notes": "Run on 2–4 USD/month VPS. Use coolify.io or caprover if self-hosting panel wanted.",
   "alternative": "railway"  // optional second-best choice
-}
+}}
+
+{format_instructions}
 """),
             ("human", "Analysis: {analysis_json}")
         ])
 
-        self.chain = self.prompt | self.llm | JsonOutputParser()
+        parser = PydanticOutputParser(pydantic_object=ArchitectRecommendation)
+        # Bound once here, so the system prompt stays a constant prefix
+        self.prompt = self.prompt.partial(format_instructions=parser.get_format_instructions())
+        self.chain = self.prompt | self.llm | parser
+        # Streaming wants progressively filled dicts, which only the plain JSON parser emits
+        self.stream_chain = self.prompt | self.llm | JsonOutputParser()
 
-    def recommend(self, analysis_json: str) -> dict:
+        # Successful recommendations keyed on SIMILARITY_FIELDS; the key space is
+        # the small set of language/framework combinations, so it needs no eviction.
+        # This is the only answer cache: it holds validated results, never a raw
+        # generation that failed the schema.
+        self._similar: dict[tuple, dict] = {}
+        # Latest successful recommendation per framework, the preferred fallback
+        self._last_success: dict[str, dict] = {}
+
+        self._failures = 0
+        self._opened_at = 0.0
+        # recommend() runs in worker threads and arecommend() in coroutines; both update the breaker
+        self._breaker_lock = threading.Lock()
+
+    def recommend(self, analysis_json: str | dict) -> dict:
+        analysis, known = self._lookup(analysis_json)
+        if known is not None:
+            return known
+        if not self._allow_call():
+            return self._fallback(RuntimeError("Groq circuit open"), analysis)
         try:
-            result = self.chain.invoke({"analysis_json": analysis_json})
-            return result
-        except Exception as e:
-            return {
-                "platform": "docker-single-container",
-                "base_image": "python:3.11-slim",
-                "resources": {"cpu": "0.5", "memory": "1G"},
-                "notes": f"Error in architect recommendation: {str(e)}. Using safe fallback."
+            result = self.chain.invoke(self._inputs(analysis))
+        except self._recoverable_errors as e:
+            self._record_failure()
+            return self._fallback(e, analysis)
+        return self._remember(analysis, result.model_dump(exclude_none=True))
+
+    async def arecommend(self, analysis_json: str | dict) -> dict:
+        """Non-blocking recommend(): awaits the Groq round trip instead of holding a thread."""
+        analysis, known = self._lookup(analysis_json)
+        if known is not None:
+            return known
+        if not self._allow_call():
+            return self._fallback(RuntimeError("Groq circuit open"), analysis)
+        try:
+            result = await self.chain.ainvoke(self._inputs(analysis))
+        except self._recoverable_errors as e:
+            self._record_failure()
+            return self._fallback(e, analysis)
+        return self._remember(analysis, result.model_dump(exclude_none=True))
+
+    async def arecommend_batch(self, analyses: list, max_concurrency: int = 10) -> list[dict]:
+        """Recommend for many analyses concurrently; failed items get the fallback.
+
+        Rule and similarity hits skip the LLM. The rest go out as one Groq batch,
+        which counts as a single call for the breaker check.
+        """
+        lookups = [self._lookup(a) for a in analyses]
+        recommendations = [known for _, known in lookups]
+        pending = [i for i, (_, known) in enumerate(lookups) if known is None]
+        if not pending:
+            return recommendations
+        if not self._allow_call():
+            for i in pending:
+                recommendations[i] = self._fallback(RuntimeError("Groq circuit open"), lookups[i][0])
+            return recommendations
+
+        results = await self.chain.abatch(
+            [self._inputs(lookups[i][0]) for i in pending],
+            config={"max_concurrency": max_concurrency},
+            return_exceptions=True,
+        )
+        for i, r in zip(pending, results):
+            analysis = lookups[i][0]
+            if isinstance(r, self._recoverable_errors):
+                self._record_failure()
+                recommendations[i] = self._fallback(r, analysis)
+            elif isinstance(r, BaseException):
+                raise r
+            else:
+                recommendations[i] = self._remember(analysis, r.model_dump(exclude_none=True))
+        return recommendations
+
+    async def astream_recommend(self, analysis_json: str | dict):
+        """Yield progressively more complete recommendation dicts as tokens arrive.
+
+        The final yielded dict is the full, validated recommendation (or the fallback
+        on error). Rule and similarity hits are yielded at once without streaming.
+        """
+        analysis, known = self._lookup(analysis_json)
+        if known is not None:
+            yield known
+            return
+        if not self._allow_call():
+            yield self._fallback(RuntimeError("Groq circuit open"), analysis)
+            return
+        partial = None
+        try:
+            async for partial in self.stream_chain.astream(self._inputs(analysis)):
+                yield partial
+            # Partials come from the plain JSON parser; only a schema-valid answer is kept
+            result = ArchitectRecommendation.model_validate(partial)
+        except self._recoverable_errors as e:
+            self._record_failure()
+            yield self._fallback(e, analysis)
+            return
+        recommendation = self._remember(analysis, result.model_dump(exclude_none=True))
+        if recommendation != partial:
+            yield recommendation
+
+    def _lookup(self, analysis_json: str | dict) -> tuple[dict, dict | None]:
+        """Parsed analysis plus an answer that needs no LLM call (rule or cached), if any."""
+        analysis = json.loads(analysis_json) if isinstance(analysis_json, str) else analysis_json
+        known = _match_rules(analysis)
+        if known is None:
+            cached = self._similar.get(tuple(analysis.get(f) for f in SIMILARITY_FIELDS))
+            known = copy.deepcopy(cached) if cached is not None else None
+        return analysis, known
+
+    def _remember(self, analysis: dict, recommendation: dict) -> dict:
+        with self._breaker_lock:
+            self._failures = 0
+        self._similar[tuple(analysis.get(f) for f in SIMILARITY_FIELDS)] = recommendation
+        self._last_success[analysis.get("framework")] = recommendation
+        return copy.deepcopy(recommendation)
+
+    def _allow_call(self) -> bool:
+        """Whether the caller may go to Groq. While the circuit is open, only the
+        first caller after each cooldown gets through."""
+        with self._breaker_lock:
+            if self._failures < BREAKER_FAILURE_THRESHOLD:
+                return True
+            if time.monotonic() - self._opened_at < BREAKER_COOLDOWN_SECONDS:
+                return False
+            # This caller is the trial; everyone else waits out a fresh cooldown
+            self._opened_at = time.monotonic()
+            return True
+
+    def _record_failure(self) -> None:
+        with self._breaker_lock:
+            self._failures += 1
+            if self._failures >= BREAKER_FAILURE_THRESHOLD:
+                self._opened_at = time.monotonic()
+
+    def _inputs(self, analysis_json: str | dict) -> dict:
+        if not isinstance(analysis_json, str):
+            analysis_json = json.dumps(analysis_json)
+        return {"analysis_json": analysis_json}
+
+    def _fallback(self, error: Exception, analysis: dict | None = None) -> dict:
+        analysis = analysis or {}
+        framework = analysis.get("framework")
+        if framework in self._last_success:
+            recommendation = copy.deepcopy(self._last_success[framework])
+        else:
+            recommendation = {
+                **FALLBACK_RECOMMENDATION,
+                "base_image": FALLBACK_BASE_IMAGES.get(analysis.get("language"), FALLBACK_RECOMMENDATION["base_image"]),
+                "resources": dict(FALLBACK_RESOURCES.get(framework, FALLBACK_RECOMMENDATION["resources"])),
             }
+        recommendation["notes"] = f"{FALLBACK_NOTES_PREFIX}: {str(error)}. Using safe fallback."
+        return recommendation
+
+
+@functools.lru_cache(maxsize=1)
+def _get_architect() -> DeploymentArchitect:
+    """One architect per process, so the LLM client and chain are built once."""
+    return DeploymentArchitect()
 
 
-def recommend_architecture(analysis_json: str) -> str:
-    result = DeploymentArchitect().recommend(analysis_json)
-    return json.dumps(result, indent=2)
\ No newline at end of file
+def recommend_architecture(analysis_json: str | dict) -> dict:
+    return _get_architect().recommend(analysis_json)
\ No newline at end of file
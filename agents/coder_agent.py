@@ -1,5 +1,8 @@
+import copy
 import json
+import math
 import os
+import functools
 
 
 # ── Templates ────────────────────────────────────────────────
@@ -68,6 +71,43 @@ services:
 """
 
 
+# Container CMD template and extra pip packages per Python framework
+_GUNICORN_CMD = '["gunicorn", "{{module_name}}:app", "-w", "2", "-k", "{worker_class}", "--bind", "0.0.0.0:{{port}}"]'
+PYTHON_COMMANDS = {
+    "streamlit": ('["streamlit", "run", "{main_file}", "--server.port={port}", "--server.address=0.0.0.0"]', ""),
+    "fastapi": (_GUNICORN_CMD.format(worker_class="uvicorn.workers.UvicornWorker"), "gunicorn"),
+    "flask": (_GUNICORN_CMD.format(worker_class="sync"), "gunicorn"),
+    "django": (_GUNICORN_CMD.format(worker_class="sync"), "gunicorn"),
+}
+# generic python script / worker / bot
+PYTHON_DEFAULT_COMMAND = ('["python", "{main_file}"]', "")
+
+DEFAULT_CPU = 0.5
+# Docker's smallest accepted --cpus value
+MIN_CPU = 0.01
+
+
+def _parse_cpu(value) -> float:
+    """CPU count from 1, "1.0" or Kubernetes-style millicores ("500m").
+
+    Raises ValueError for anything docker-compose can't use (nan, inf, zero,
+    negative or below MIN_CPU), so the caller falls back to DEFAULT_CPU.
+    """
+    text = str(value).strip().lower()
+    if text.endswith("m"):
+        cpus = float(text[:-1]) / 1000
+    else:
+        cpus = float(text)
+    if not math.isfinite(cpus) or cpus < MIN_CPU:
+        raise ValueError(f"unusable CPU limit: {value!r}")
+    return cpus
+
+
+def _format_cpu(cpus: float) -> str:
+    """Fixed-point CPU count as docker-compose expects it ("0.5", "2", "1.25")."""
+    return f"{cpus:.2f}".rstrip("0").rstrip(".")
+
+
 # ─────────────────────────────────────────────────────────────
 
 class ConfigurationGenerator:
@@ -77,7 +117,10 @@ class ConfigurationGenerator:
         port = analysis["port"]
         main_file = analysis["main_file"]
         base_image = recommendation.get("base_image", "python:3.11-slim" if lang == "python" else "node:20-alpine")
-        cpu = recommendation.get("resources", {}).get("cpu", "0.5")
+        try:
+            cpu = _format_cpu(_parse_cpu(recommendation.get("resources", {}).get("cpu", DEFAULT_CPU)))
+        except ValueError:
+            cpu = _format_cpu(DEFAULT_CPU)
         memory = recommendation.get("resources", {}).get("memory", "1G")
 
         health_path = "/health" if framework in ("fastapi", "flask") else "/"
@@ -86,23 +129,8 @@ class ConfigurationGenerator:
         cmd = ""
 
         if lang == "python":
-            module_name = main_file.replace(".py", "")
-
-            if framework == "streamlit":
-                cmd = f'["streamlit", "run", "{main_file}", "--server.port={port}", "--server.address=0.0.0.0"]'
-            elif framework in ("fastapi", "flask", "django"):
-                gunicorn_line = "gunicorn"
-                # Choose worker class BEFORE building the string
-                worker_class = "uvicorn.workers.UvicornWorker" if framework == "fastapi" else "sync"
-                cmd = (
-                    f'["gunicorn", "{module_name}:app", '
-                    f'"-w", "2", '
-                    f'"-k", "{worker_class}", '
-                    f'"--bind", "0.0.0.0:{port}"]'
-                )
-            else:
-                # generic python script / worker / bot
-                cmd = f'["python", "{main_file}"]'
+            cmd_template, gunicorn_line = PYTHON_COMMANDS.get(framework, PYTHON_DEFAULT_COMMAND)
+            cmd = cmd_template.format(main_file=main_file, module_name=main_file.replace(".py", ""), port=port)
 
         else:  # nodejs
             # Simple heuristic — prefer npm start if scripts exist, else direct node
@@ -142,9 +170,23 @@ class ConfigurationGenerator:
         }
 
 
-def generate_configs(analysis_json: str, recommendation_json: str) -> str:
-    """Module-level function called by the orchestrator. Returns JSON string."""
-    analysis = json.loads(analysis_json)
-    recommendation = json.loads(recommendation_json)
-    result = ConfigurationGenerator().generate(analysis, recommendation)
-    return json.dumps(result, indent=2)
\ No newline at end of file
+@functools.lru_cache(maxsize=1)
+def _get_generator() -> ConfigurationGenerator:
+    return ConfigurationGenerator()
+
+
+@functools.lru_cache(maxsize=256)
+def _render_configs(analysis_key: str, recommendation_key: str) -> dict:
+    """Generation is deterministic, so results are cached on the canonical JSON of the inputs."""
+    return _get_generator().generate(json.loads(analysis_key), json.loads(recommendation_key))
+
+
+def generate_configs(analysis_json: str | dict, recommendation_json: str | dict) -> dict:
+    """Module-level function called by the orchestrator. Accepts JSON strings or dicts, returns a dict."""
+    analysis = json.loads(analysis_json) if isinstance(analysis_json, str) else analysis_json
+    recommendation = json.loads(recommendation_json) if isinstance(recommendation_json, str) else recommendation_json
+    # Copied so callers can't mutate the cached result
+    return copy.deepcopy(_render_configs(
+        json.dumps(analysis, sort_keys=True),
+        json.dumps(recommendation, sort_keys=True),
+    ))
\ No newline at end of file
@@ -1,75 +1,347 @@
 import os
 import json
+import time
+import logging
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
 from dotenv import load_dotenv
 
-# Import local agent tools
-from analyst_agent import analyze_repository
-from architect_agent import recommend_architecture
-from coder_agent import generate_configs
-from security_agent import validate_configs
-
 load_dotenv()
 
+# Library code only emits records; __main__ (or the host app) decides where they go
+logger = logging.getLogger(__name__)
+
+
+# ── Stage cache ───────────────────────────────────────────────
+# Analysis and architect results persisted across runs, keyed by the stage
+# input. The agent's source mtime is part of the key, so editing an agent
+# invalidates its entries. Any sqlite/filesystem problem is treated as a miss.
+# Set DEPLOYFLOW_NO_CACHE (or CACHE_PATH = None) to keep the library off the disk.
+CACHE_PATH = None if os.getenv("DEPLOYFLOW_NO_CACHE") else Path.home() / ".deployflow" / "cache.db"
+CACHE_TTL_SECONDS = 24 * 60 * 60
+STAGE_SOURCES = {
+    "analysis": Path(__file__).with_name("analyst_agent.py"),
+    "recommendations": Path(__file__).with_name("architect_agent.py"),
+}
+
+
+def _agent_name(agent) -> str:
+    """Functions get their dotted name. Partials and callable instances have no
+    __qualname__ and fall back to repr, which may differ per process: a miss, never a clash."""
+    qualname = getattr(agent, "__qualname__", None)
+    if qualname is None:
+        return repr(agent)
+    return f"{agent.__module__}.{qualname}"
+
+
+def _stage_key(stage: str, agent, payload: str) -> str:
+    try:
+        mtime = STAGE_SOURCES[stage].stat().st_mtime_ns
+    except OSError:
+        mtime = 0
+    # The agent's name keeps injected stubs from sharing entries with the real agents
+    return hashlib.blake2b(f"{stage}|{_agent_name(agent)}|{mtime}|{payload}".encode()).hexdigest()
+
+
+def _cache_get(stage: str, key: str) -> str | None:
+    if CACHE_PATH is None:
+        return None
+    try:
+        with closing(sqlite3.connect(CACHE_PATH)) as db:
+            row = db.execute(
+                "SELECT value, created FROM stage_cache WHERE stage = ? AND key = ?", (stage, key)
+            ).fetchone()
+    except sqlite3.Error:
+        return None
+    if row is None or time.time() - row[1] > CACHE_TTL_SECONDS:
+        return None
+    return row[0]
+
+
+def _cache_put(stage: str, key: str, value: str) -> None:
+    if CACHE_PATH is None:
+        return
+    now = time.time()
+    try:
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with closing(sqlite3.connect(CACHE_PATH)) as db, db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS stage_cache "
+                "(stage TEXT, key TEXT, value TEXT, created REAL, PRIMARY KEY (stage, key))"
+            )
+            # Expired rows are never read again; drop them so the file doesn't grow forever
+            db.execute("DELETE FROM stage_cache WHERE created < ?", (now - CACHE_TTL_SECONDS,))
+            db.execute(
+                "INSERT OR REPLACE INTO stage_cache VALUES (?, ?, ?, ?)", (stage, key, value, now)
+            )
+    except (sqlite3.Error, OSError):
+        pass
+
+
+def _cached_stage(stage: str, agent, payload: str | dict, cacheable=None) -> dict:
+    """agent(payload), served from the stage cache; JSON only exists at the sqlite boundary.
+
+    cacheable(result) -> bool can veto persisting a result; by default every result is kept.
+    """
+    payload_key = payload if isinstance(payload, str) else json.dumps(payload, sort_keys=True)
+    key = _stage_key(stage, agent, payload_key)
+    cached = _cache_get(stage, key)
+    if cached is not None:
+        return json.loads(cached)
+    result = agent(payload)
+    if cacheable is None or cacheable(result):
+        _cache_put(stage, key, json.dumps(result))
+    return result
+
+
+def _not_architect_fallback(recommendation: dict) -> bool:
+    from architect_agent import FALLBACK_NOTES_PREFIX
+    # Never persist the architect's error fallback; the next run should retry Groq
+    return not str(recommendation.get("notes", "")).startswith(FALLBACK_NOTES_PREFIX)
+
+# ─────────────────────────────────────────────────────────────
+
+
+REPORT_TEMPLATE = """\
+# DeployFlow Report
+**Status**: {status}
+**Security Score**: {score}%
+**Platform**: {platform}
+**Base Image**: {base_image}
+**Generated**: {dockerfile_lines} lines Dockerfile + docker-compose.yml"""
+
+
+@dataclass(slots=True)
+class WorkflowState:
+    """Progress and per-stage results of one workflow run."""
+    step: int = 0
+    status: str = "initialized"
+    analysis: dict | None = None
+    recommendations: dict | None = None
+    configs: dict | None = None
+    security: dict | None = None
+    error: str | None = None
+
 
 class DeployFlowOrchestrator:
-    def run_workflow(self, repo_content: str) -> dict:
-        print("🚀 Starting DeployFlow Workflow...")
+    def __init__(self, analyze_fn=None, recommend_fn=None, generate_fn=None, validate_fn=None):
+        # Each stage is swappable, e.g. for an offline stub of the Groq-backed architect.
+        # Stages left as None use the real agents, imported on the first run.
+        self.analyze_fn = analyze_fn
+        self.recommend_fn = recommend_fn
+        self.generate_fn = generate_fn
+        self.validate_fn = validate_fn
+        # Only the real architect has an error fallback to keep out of the stage cache
+        self._cache_recommendation = None
+        # Only the real security agent reads the rules YAML worth prefetching
+        self._load_rules = None
+        self.state = WorkflowState()
 
-        # STEP 1 — Analyst Agent (logic-based)
-        # Detects language, framework, port, and main file.
-        analysis_json = analyze_repository(repo_content=repo_content)
-        analysis = json.loads(analysis_json)
-        print(f"✅ Analysis: {analysis['language']} / {analysis['framework']} on port {analysis['port']}")
+    def _load_agents(self) -> None:
+        if self.analyze_fn is None:
+            from analyst_agent import analyze_repository
+            self.analyze_fn = analyze_repository
+        if self.recommend_fn is None:
+            from architect_agent import recommend_architecture
+            self.recommend_fn = recommend_architecture
+            self._cache_recommendation = _not_architect_fallback
+        if self.generate_fn is None:
+            from coder_agent import generate_configs
+            self.generate_fn = generate_configs
+        if self.validate_fn is None:
+            from security_agent import validate_configs, load_security_rules
+            self.validate_fn = validate_configs
+            self._load_rules = load_security_rules
 
-        # STEP 2 — Architect Agent (LLM-powered via Groq)
-        # Recommends base image, resource limits, and VPS strategy.
-        recommendation_json = recommend_architecture(analysis_json)
-        recommendations = json.loads(recommendation_json)
-        print(f"✅ Architecture: {recommendations.get('platform', 'docker-vps')} | base: {recommendations.get('base_image')}")
+    def run_workflow(self, repo_content: str, fail_fast: bool = False) -> dict:
+        """Blocking entry point for scripts and Streamlit.
 
-        # STEP 3 — Coder Agent (template-based)
-        # Generates Dockerfile + docker-compose.yml from templates.
-        configs_json = generate_configs(analysis_json, recommendation_json)
-        configs = json.loads(configs_json)
-        print("✅ Configs generated: Dockerfile + docker-compose.yml")
+        Async callers should await run_workflow_async instead. Called from a thread
+        with a running event loop (Jupyter, async web handlers), this runs the
+        workflow on a worker thread with its own loop and blocks until it is done.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.run_workflow_async(repo_content, fail_fast))
+        # asyncio.run() refuses to nest inside a running loop
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(asyncio.run, self.run_workflow_async(repo_content, fail_fast)).result()
 
-        # Inside run_workflow method — replace the security part:
+    async def run_batch_async(self, repos: list[str], max_concurrency: int = 8
+                              ) -> tuple[list[dict], list[WorkflowState]]:
+        """Run one workflow per repo snapshot, overlapping up to max_concurrency Groq waits.
 
-        # STEP 4 — Security Agent (now much stronger)
+        Returns the results and each run's own WorkflowState, in repo order. Batch runs
+        leave self.state (and so get_workflow_status) alone.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        states = [WorkflowState() for _ in repos]
+
+        async def run_one(repo_content: str, state: WorkflowState) -> dict:
+            async with semaphore:
+                return await self.run_workflow_async(repo_content, state=state)
+
+        results = await asyncio.gather(*(run_one(r, s) for r, s in zip(repos, states)))
+        return results, states
+
+    async def run_workflow_async(self, repo_content: str, fail_fast: bool = False,
+                                 state: WorkflowState | None = None) -> dict:
+        """Run all four stages. With fail_fast, a blocked run returns only
+        {"status": "blocked", "security": ...} and skips building the report.
+        Progress goes to state when given, otherwise to a fresh self.state."""
+        logger.info("🚀 Starting DeployFlow Workflow...")
+        if state is None:
+            # The most recent single run's state stays inspectable on the orchestrator
+            state = self.state = WorkflowState()
+        state.status = "running"
         try:
-            security_json = validate_configs(configs_json)
-            security = json.loads(security_json)
-            print(f"✅ Security Scan: {security['status']} | {security['total_issues']} issues | Score: {security.get('compliance_score', 0)}%")
+            analysis, recommendations, configs, security = await self._run_stages(state, repo_content)
         except Exception as e:
-            security = {"status": "ERROR", "total_issues": 1, "issues": [{"message": f"Security scanner failed: {e}"}]}
-            print("❌ Security scan crashed — treated as BLOCKED")
+            # Whichever stage raised, the run is over; don't leave it reporting "running"
+            state.status, state.error = "failed", str(e)
+            raise
+        state.status = "completed"
 
-        if security["status"] in ("BLOCKED", "ERROR"):
-            print("🚨 DEPLOYMENT BLOCKED — Critical security issues found:")
+        if security["status"] in ("BLOCKED", "ERROR") and logger.isEnabledFor(logging.WARNING):
+            logger.warning("🚨 DEPLOYMENT BLOCKED — Critical security issues found:")
             for issue in security.get("issues", []):
-                print(f"   [{issue.get('severity', 'CRITICAL')}] {issue.get('rule')} → {issue.get('message')}")
-                print(f"   Fix: {issue.get('fix', 'See report')}\n")
+                logger.warning("   [%s] %s → %s\n   Fix: %s\n",
+                               issue.get("severity", "CRITICAL"), issue.get("rule"),
+                               issue.get("message"), issue.get("fix", "See report"))
+
+        if fail_fast and security["status"] in ("BLOCKED", "ERROR"):
+            return {"status": "blocked", "security": security}
 
         return {
             "analysis": analysis,
             "architecture": recommendations,
             "files": configs,
             "security": security,
-            "report_summary": f"""
-            # DeployFlow Report
-            **Status**: {security['status']}
-            **Security Score**: {security.get('compliance_score', 0)}%
-            **Platform**: {recommendations.get('platform')}
-            **Base Image**: {recommendations.get('base_image')}
-            **Generated**: {len(configs.get('dockerfile', '').splitlines())} lines Dockerfile + docker-compose.yml
-                        """.strip()
+            "report_summary": REPORT_TEMPLATE.format_map({
+                "status": security["status"],
+                "score": security.get("compliance_score", 0),
+                "platform": recommendations.get("platform"),
+                "base_image": recommendations.get("base_image"),
+                "dockerfile_lines": len(configs.get("dockerfile", "").splitlines()),
+            }),
         }
 
+    async def _run_stages(self, state: WorkflowState, repo_content: str) -> tuple[dict, dict, dict, dict]:
+        """Steps 1-4, recording progress and results on state as they complete."""
+        # Only the security step needs the rules, and nothing before it feeds them:
+        # load them in the background from the very start.
+        self._load_agents()
+        rules_task = None
+        if self._load_rules is not None:
+            rules_task = asyncio.create_task(asyncio.to_thread(self._load_rules))
+
+        try:
+            # STEP 1 — Analyst Agent (logic-based)
+            # Detects language, framework, port, and main file.
+            state.step = 1
+            state.analysis = analysis = await asyncio.to_thread(
+                _cached_stage, "analysis", self.analyze_fn, repo_content)
+            logger.info("✅ Analysis: %s / %s on port %s", analysis["language"], analysis["framework"], analysis["port"])
+
+            # STEP 2 — Architect Agent (LLM-powered via Groq)
+            # Recommends base image, resource limits, and VPS strategy.
+            state.step = 2
+            state.recommendations = recommendations = await asyncio.to_thread(
+                _cached_stage, "recommendations", self.recommend_fn, analysis, self._cache_recommendation)
+            logger.info("✅ Architecture: %s | base: %s", recommendations.get("platform", "docker-vps"), recommendations.get("base_image"))
+
+            # STEP 3 — Coder Agent (template-based)
+            # Generates Dockerfile + docker-compose.yml from templates.
+            state.step = 3
+            state.configs = configs = await asyncio.to_thread(self.generate_fn, analysis, recommendations)
+            logger.info("✅ Configs generated: Dockerfile + docker-compose.yml")
+        except BaseException:
+            # The run ends before step 4; don't leave the prefetch unawaited
+            if rules_task is not None:
+                rules_task.cancel()
+                await asyncio.gather(rules_task, return_exceptions=True)
+            raise
+
+        # STEP 4 — Security Agent (now much stronger)
+        state.step = 4
+        if rules_task is not None:
+            # A rules failure resurfaces (and is handled) inside validation below
+            await asyncio.gather(rules_task, return_exceptions=True)
+        try:
+            security = await asyncio.to_thread(self.validate_fn, configs)
+            logger.info("✅ Security Scan: %s | %s issues | Score: %s%%",
+                        security["status"], security["total_issues"], security.get("compliance_score", 0))
+        except Exception as e:
+            security = {"status": "ERROR", "total_issues": 1, "issues": [{"message": f"Security scanner failed: {e}"}]}
+            state.error = str(e)
+            logger.error("❌ Security scan crashed — treated as BLOCKED")
+        state.security = security
+        return analysis, recommendations, configs, security
 
 
+# A lock rather than lru_cache: two racing first calls must not build two
+# orchestrators, or get_workflow_status could report on the wrong one.
+_orchestrator: DeployFlowOrchestrator | None = None
+_orchestrator_lock = threading.Lock()
+
+
+def _get_orchestrator() -> DeployFlowOrchestrator:
+    global _orchestrator
+    with _orchestrator_lock:
+        if _orchestrator is None:
+            _orchestrator = DeployFlowOrchestrator()
+        return _orchestrator
+
+
+def orchestrate_deployment(repo_content: str, fail_fast: bool = False) -> dict:
+    """Module-level entry point; repeated calls reuse one orchestrator and its warm agents.
+    Blocks like run_workflow; from async code, await run_workflow_async instead."""
+    return _get_orchestrator().run_workflow(repo_content, fail_fast)
+
+
+def get_workflow_status() -> dict:
+    """Progress of the latest orchestrate_deployment run."""
+    state = _get_orchestrator().state
+    return {"step": state.step, "status": state.status, "error": state.error}
+
 
 if __name__ == "__main__":
-    orchestrator = DeployFlowOrchestrator()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the DeployFlow pipeline")
+    parser.add_argument("--batch", metavar="REPOS_TXT",
+                        help="file listing one repo snapshot path per line; prints a summary per repo")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if os.getenv("DEPLOYFLOW_OFFLINE"):
+        # Smoke-test the pipeline without a Groq round trip
+        offline_recommendation = {
+            "platform": "docker-single-container",
+            "base_image": "python:3.11-slim",
+            "resources": {"cpu": "0.5", "memory": "512M"},
+            "notes": "Offline stub recommendation.",
+        }
+        orchestrator = DeployFlowOrchestrator(recommend_fn=lambda analysis: dict(offline_recommendation))
+    else:
+        orchestrator = DeployFlowOrchestrator()
+
+    if args.batch:
+        paths = [line.strip() for line in Path(args.batch).read_text(encoding="utf-8").splitlines() if line.strip()]
+        repos = [Path(p).read_text(encoding="utf-8") for p in paths]
+        batch_results, _ = asyncio.run(orchestrator.run_batch_async(repos))
+        for path, results in zip(paths, batch_results):
+            print(f"\n--- {path} ---")
+            print(results["report_summary"])
+        raise SystemExit(0)
+
     test_repo = "requirements.txt: flask==2.3.0\napp.py: from flask import Flask\napp.run(port=5000)"
     results = orchestrator.run_workflow(test_repo)
     print("\n--- Security Report ---")
@@ -1,20 +1,61 @@
 import re
 import json
+import functools
+from collections import Counter, namedtuple
 from pathlib import Path
 import yaml
 
+# libyaml's C loader when PyYAML was built with it, otherwise the pure-Python one
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+# Anchored to this file, so the rules load no matter which directory the app is started from
+RULES_PATH = Path(__file__).resolve().parent.parent / "security_rules" / "security_rules.yaml"
+
+# One entry of security_rules.yaml; patterns are compiled, files/check only
+# matter for regex/logic rules respectively
+Rule = namedtuple("Rule", "id severity description type files patterns check")
+
+
+def load_security_rules(path: Path = RULES_PATH) -> tuple[Rule, ...]:
+    """Rules from a rules YAML in file order, re-read only when the file changes."""
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Security rules file not found: {path}") from None
+    return _load_security_rules_cached(path, mtime_ns)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_security_rules_cached(path: Path, mtime_ns: int) -> tuple[Rule, ...]:
+    # mtime_ns is only part of the cache key: an edited YAML misses and is parsed again
+    with open(path, encoding="utf-8") as f:
+        data = yaml.load(f, Loader=SafeLoader)
+    return tuple(
+        Rule(
+            id=rule_id,
+            severity=rule["severity"],
+            description=rule["description"],
+            type=rule.get("type", "regex"),
+            files=tuple(rule.get("files", ["dockerfile"])),
+            # Block-scalar (|) patterns carry a trailing newline that no single line can match
+            patterns=tuple(re.compile(p.strip(), re.IGNORECASE) for p in rule.get("patterns", [])),
+            check=rule.get("check"),
+        )
+        for rule_id, rule in data["rules"].items()
+    )
+
 
 class SecurityValidator:
     def __init__(self):
-        self.rules_path = Path("security_rules/security_rules.yaml")
+        self.rules_path = RULES_PATH
         self.rules = self._load_rules()
 
     def _load_rules(self):
-        if not self.rules_path.exists():
-            raise FileNotFoundError(f"Security rules file not found: {self.rules_path}")
-        with open(self.rules_path, encoding="utf-8") as f:
-            data = yaml.safe_load(f)
-        return data["rules"]
+        return load_security_rules(self.rules_path)
 
     def validate(self, configs_json: str | dict) -> dict:
         if isinstance(configs_json, str):
@@ -27,50 +68,17 @@ class SecurityValidator:
         files = {"dockerfile": dockerfile, "docker-compose": docker_compose}
 
         issues = []
-
-        for rule_id, rule in self.rules.items():
-            severity = rule["severity"]
-            rule_type = rule.get("type", "regex")
-
-            if rule_type == "regex":
-                patterns = rule.get("patterns", [])
-                target_files = rule.get("files", ["dockerfile"])
-                for fname in target_files:
-                    content = files.get(fname, "")
-                    for pattern in patterns:
-                        for i, line in enumerate(content.splitlines(), 1):
-                            if re.search(pattern, line, re.IGNORECASE):
-                                issues.append({
-                                    "rule": rule_id,
-                                    "severity": severity,
-                                    "message": rule["description"],
-                                    "location": fname,
-                                    "line": i,
-                                    "matched": line.strip(),
-                                    "fix": self._get_fix(rule_id)
-                                })
-                                break  # one hit per rule per file
-
-            elif rule_type == "logic":
-                check = rule.get("check")
-                if check == "no_non_root_user":
-                    if "USER " not in dockerfile or "USER root" in dockerfile or "USER 0" in dockerfile:
-                        issues.append({
-                            "rule": rule_id, "severity": severity,
-                            "message": rule["description"], "location": "dockerfile",
-                            "fix": self._get_fix(rule_id)
-                        })
-                elif check == "no_healthcheck":
-                    if "HEALTHCHECK" not in dockerfile:
-                        issues.append({
-                            "rule": rule_id, "severity": severity,
-                            "message": rule["description"], "location": "dockerfile",
-                            "fix": self._get_fix(rule_id)
-                        })
+        for fname, content in files.items():
+            issues.extend(self.scan_file(fname, content))
+        issues.extend(self._logic_issues(dockerfile))
+        # Report in rule order, as if each rule had been checked across all files in turn
+        rule_order = {rule.id: i for i, rule in enumerate(self.rules)}
+        issues.sort(key=lambda issue: rule_order[issue["rule"]])
 
         # Count & decide status
-        critical = sum(1 for i in issues if i["severity"] == "CRITICAL")
-        high = sum(1 for i in issues if i["severity"] == "HIGH")
+        counts = Counter(i["severity"] for i in issues)
+        critical = counts["CRITICAL"]
+        high = counts["HIGH"]
 
         if critical > 0:
             status = "BLOCKED"
@@ -90,6 +98,48 @@ class SecurityValidator:
             "recommendation": "Deployment ready for production" if status == "APPROVED" else "Fix issues before deploying"
         }
 
+    def scan_file(self, fname: str, content: str) -> list[dict]:
+        """Regex-rule issues for one generated file, at most one per rule."""
+        issues = []
+        lines = content.splitlines()
+        for rule in self.rules:
+            if rule.type != "regex" or fname not in rule.files:
+                continue
+            for pattern in rule.patterns:
+                for i, line in enumerate(lines, 1):
+                    if pattern.search(line):
+                        issues.append({
+                            "rule": rule.id,
+                            "severity": rule.severity,
+                            "message": rule.description,
+                            "location": fname,
+                            "line": i,
+                            "matched": line.strip(),
+                            "fix": self._get_fix(rule.id)
+                        })
+                        break  # one hit per rule per file
+
+        return issues
+
+    def _logic_issues(self, dockerfile: str) -> list[dict]:
+        issues = []
+        for rule in self.rules:
+            if rule.type != "logic":
+                continue
+            if rule.check == "no_non_root_user":
+                failed = "USER " not in dockerfile or "USER root" in dockerfile or "USER 0" in dockerfile
+            elif rule.check == "no_healthcheck":
+                failed = "HEALTHCHECK" not in dockerfile
+            else:
+                continue
+            if failed:
+                issues.append({
+                    "rule": rule.id, "severity": rule.severity,
+                    "message": rule.description, "location": "dockerfile",
+                    "fix": self._get_fix(rule.id)
+                })
+        return issues
+
     def _get_fix(self, rule_id: str) -> str:
         fixes = {
             "SEC001": "Move secrets to .env / Docker Secrets / Railway variables. Never commit them.",
@@ -104,7 +154,6 @@ class SecurityValidator:
         return fixes.get(rule_id, "Review and apply the recommended fix.")
 
 
-def validate_configs(configs_json: str) -> str:
+def validate_configs(configs_json: str | dict) -> dict:
     """Module-level function called by orchestrator"""
-    result = SecurityValidator().validate(configs_json)
-    return json.dumps(result, indent=2)
\ No newline at end of file
+    return SecurityValidator().validate(configs_json)
\ No newline at end of file
@@ -8,12 +8,44 @@ from dotenv import load_dotenv
 
 # Import your agents (adjust paths if needed)
 from agents.analyst_agent import analyze_repository
-from agents.architect_agent import recommend_architecture
+from agents.architect_agent import recommend_architecture, FALLBACK_NOTES_PREFIX
 from agents.coder_agent import generate_configs
-# from security_rules.security_scanner import SecurityScanner  # ← assuming this is the updated one
 from agents.security_agent import validate_configs
 load_dotenv()
 
+# Custom CSS for better Karachi/edtech branding feel (optional)
+APP_CSS = """
+    <style>
+    .stApp { background: linear-gradient(135deg, #f0f4f8, #e0e7ff); }
+    .stButton>button { background-color: #4f46e5; color: white; border-radius: 8px; }
+    .stSuccess { background-color: #d1fae5; border-left: 6px solid #10b981; }
+    .stError   { background-color: #fee2e2; border-left: 6px solid #ef4444; }
+    </style>
+"""
+
+REPO_INPUT_PLACEHOLDER = (
+    "Example:\nrequirements.txt: fastapi==0.115.0\nuvicorn==0.32.0\n\n"
+    "main.py:\nfrom fastapi import FastAPI\napp = FastAPI()\n@app.get('/')\ndef root(): return {'msg': 'hello'}"
+)
+
+
+@st.cache_data(show_spinner=False, ttl=3600)
+def run_pipeline(repo_input: str) -> dict:
+    """All four agents for one repo snapshot; unchanged input is served from cache."""
+    # Step 1: Analyst
+    analysis = analyze_repository(repo_content=repo_input)
+
+    # Step 2: Architect
+    arch = recommend_architecture(analysis)
+
+    # Step 3: Coder
+    configs = generate_configs(analysis, arch)
+
+    # Step 4: Security
+    security = validate_configs(configs)
+
+    return {"analysis": analysis, "arch": arch, "configs": configs, "security": security}
+
 # ────────────────────────────────────────────────
 # Page config & theme
 # ────────────────────────────────────────────────
@@ -29,15 +61,7 @@ st.set_page_config(
     }
 )
 
-# Custom CSS for better Karachi/edtech branding feel (optional)
-st.markdown("""
-    <style>
-    .stApp { background: linear-gradient(135deg, #f0f4f8, #e0e7ff); }
-    .stButton>button { background-color: #4f46e5; color: white; border-radius: 8px; }
-    .stSuccess { background-color: #d1fae5; border-left: 6px solid #10b981; }
-    .stError   { background-color: #fee2e2; border-left: 6px solid #ef4444; }
-    </style>
-""", unsafe_allow_html=True)
+st.markdown(APP_CSS, unsafe_allow_html=True)
 
 # ────────────────────────────────────────────────
 # Sidebar – Controls & Info
@@ -64,7 +88,7 @@ if input_mode == "Paste repo content":
     repo_input = st.text_area(
         "Repository snapshot (file names + content)",
         height=240,
-        placeholder="Example:\nrequirements.txt: fastapi==0.115.0\nuvicorn==0.32.0\n\nmain.py:\nfrom fastapi import FastAPI\napp = FastAPI()\n@app.get('/')\ndef root(): return {'msg': 'hello'}",
+        placeholder=REPO_INPUT_PLACEHOLDER,
         help="Include file names followed by : and content. One file per block. Focus on key files."
     )
 else:
@@ -79,37 +103,19 @@ if st.button("✨ Analyze & Generate Package", type="primary", use_container_wid
 
     with st.spinner("DeployFlow agents at work... (Analyst → Architect → Coder → Security)"):
         try:
-            # Step 1: Analyst
-            analysis_json = analyze_repository(repo_content=repo_input)
-            analysis = json.loads(analysis_json)
-
-            # Step 2: Architect
-            arch_json = recommend_architecture(analysis_json)
-            arch = json.loads(arch_json)
-
-            # Step 3: Coder
-            configs_json = generate_configs(analysis_json, arch_json)
-            configs = json.loads(configs_json)
-
-            # Inside the try block, replace the scanner lines with:
-
-            security_json = validate_configs(json.dumps(configs))
-            security_result = json.loads(security_json)
+            results = run_pipeline(repo_input)
+            analysis = results["analysis"]
+            arch = results["arch"]
+            configs = results["configs"]
+            security_result = results["security"]
+            if arch.get("notes", "").startswith(FALLBACK_NOTES_PREFIX):
+                # Don't keep serving the safe fallback for this input once Groq is reachable again
+                run_pipeline.clear(repo_input)
 
             status = security_result.get("status", "UNKNOWN")
             score = security_result.get("compliance_score", 0.0)
             issues = security_result.get("issues", [])
 
-            # Step 4: Security (using your updated scanner)
-            
-            # scanner = SecurityScanner()
-            # # Assuming your scanner now accepts both dockerfile & docker_compose
-            # security_result = json.loads(scanner.validate(json.dumps(configs)))  # ← updated call
-
-            # status = security_result.get("status", "UNKNOWN")
-            # issues = security_result.get("issues", [])
-            # score = security_result.get("compliance_score", 0)
-
             # ── Results layout ───────────────────────────────────
             st.markdown("---")
             cols = st.columns([2, 1])
@@ -138,7 +144,6 @@ if st.button("✨ Analyze & Generate Package", type="primary", use_container_wid
                         if issues:
                             for issue in issues:
                                 sev = issue.get("severity", "UNKNOWN")
-                                color = {"CRITICAL": "red", "HIGH": "orange", "MEDIUM": "blue"}.get(sev, "grey")
                                 st.markdown(f"**[{sev}]** {issue.get('message')}  \n{issue.get('fix', '')}", unsafe_allow_html=True)
                         else:
                             st.info("No issues detected")
@@ -1,8 +1,73 @@
 import re
 import yaml
 import os
+import functools
 from typing import List, Dict, Tuple
 
+# libyaml's C loader when PyYAML was built with it, otherwise the pure-Python one
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+# security_rules.yaml's logic check names -> the checks scan_dockerfile implements
+YAML_CHECKS = {"no_non_root_user": "missing_nonroot_user", "no_healthcheck": "missing_healthcheck"}
+
+
+def _rules_from_yaml(data: Dict) -> List[Dict]:
+    """The YAML's `rules:` mapping (rule id -> spec, shared with agents/security_agent.py)
+    as scanner rule dicts. Regex rules that don't target Dockerfiles are skipped."""
+    rules = []
+    for rule_id, spec in data.get("rules", {}).items():
+        if spec.get("type", "regex") == "regex" and "dockerfile" not in spec.get("files", ["dockerfile"]):
+            continue
+        rules.append({
+            "rule_id": rule_id,
+            "severity": spec.get("severity", "MEDIUM"),
+            "message": spec.get("description", "Security issue detected."),
+            "check": YAML_CHECKS.get(spec.get("check"), spec.get("check")),
+            # Block-scalar (|) patterns carry a trailing newline that no single line can match
+            "patterns": [p.strip() for p in spec.get("patterns", [])],
+        })
+    return rules
+
+
+@functools.lru_cache(maxsize=4)
+def _load_rules_cached(rules_path: str, mtime_ns: int | None) -> List[Dict]:
+    """Parsed and compiled rules, shared by every scanner.
+
+    The file's mtime is part of the cache key, so editing the YAML is picked up
+    by the next SecurityScanner without a restart.
+    """
+    try:
+        with open(rules_path, "r") as f:
+            data = yaml.load(f, Loader=SafeLoader)
+        rules = _rules_from_yaml(data)
+    except FileNotFoundError:
+        # Fallback: inline rules if YAML file is missing
+        rules = [
+            {
+                "rule_id": "SEC001",
+                "severity": "CRITICAL",
+                "patterns": [r'(?i)(PASSWORD|API_KEY|SECRET|TOKEN)\s*=\s*[\'"]?[a-zA-Z0-9_\-]{4,}'],
+                "message": "Hardcoded secrets found. Use environment variables.",
+                "fix_suggestion": "Pass secrets via environment variables at runtime.",
+            },
+            {
+                "rule_id": "SEC002",
+                "severity": "CRITICAL",
+                "check": "missing_nonroot_user",
+                "message": "Container should not run as root.",
+                "fix_suggestion": "Add a non-root USER instruction before CMD.",
+            },
+        ]
+
+    # Compiled once here instead of on every line of every scan
+    for rule in rules:
+        rule["_compiled"] = tuple(re.compile(p, re.IGNORECASE) for p in rule.get("patterns", ()))
+    return rules
+
 
 class SecurityScanner:
     """
@@ -11,6 +76,16 @@ class SecurityScanner:
     """
 
     SEVERITY_SCORES = {"CRITICAL": 30, "HIGH": 20, "MEDIUM": 10}
+    SEVERITY_ICONS = {"CRITICAL": "🚨", "HIGH": "⚠️"}  # anything else gets 💡
+    # Any USER instruction other than root
+    NONROOT_USER_RE = re.compile(r'^\s*USER\s+(?!root\s*$)\w+', re.MULTILINE)
+    # Reported instead of running the rules when there is no Dockerfile at all
+    EMPTY_DOCKERFILE_ISSUE = {
+        "rule_id": "SEC000",
+        "severity": "CRITICAL",
+        "message": "Empty Dockerfile",
+        "fix": "Generate configuration",
+    }
 
     def __init__(self):
         self.rules = self._load_rules()
@@ -18,35 +93,22 @@ class SecurityScanner:
     def _load_rules(self) -> List[Dict]:
         rules_path = os.path.join(os.path.dirname(__file__), "security_rules.yaml")
         try:
-            with open(rules_path, "r") as f:
-                data = yaml.safe_load(f)
-            return data.get("security_rules", [])
+            mtime_ns = os.stat(rules_path).st_mtime_ns
         except FileNotFoundError:
-            # Fallback: inline rules if YAML file is missing
-            return [
-                {
-                    "rule_id": "SEC001",
-                    "severity": "CRITICAL",
-                    "pattern": r'(?i)(PASSWORD|API_KEY|SECRET|TOKEN)\s*=\s*[\'"]?[a-zA-Z0-9_\-]{4,}',
-                    "message": "Hardcoded secrets found. Use environment variables.",
-                    "fix_suggestion": "Pass secrets via environment variables at runtime.",
-                },
-                {
-                    "rule_id": "SEC002",
-                    "severity": "CRITICAL",
-                    "check": "missing_nonroot_user",
-                    "message": "Container should not run as root.",
-                    "fix_suggestion": "Add a non-root USER instruction before CMD.",
-                },
-            ]
+            mtime_ns = None
+        return _load_rules_cached(rules_path, mtime_ns)
 
     def scan_dockerfile(self, content: str) -> Tuple[List[Dict], int]:
         """
         Scans Dockerfile content against all loaded rules.
         Returns (issues list, risk score 0-100).
         """
+        if not content or content.isspace():
+            return [dict(self.EMPTY_DOCKERFILE_ISSUE)], self.SEVERITY_SCORES["CRITICAL"]
+
         issues = []
         score = 0
+        lines = content.splitlines()
 
         for rule in self.rules:
             rule_id = rule.get("rule_id", "UNKNOWN")
@@ -54,7 +116,7 @@ class SecurityScanner:
             message = rule.get("message", "Security issue detected.")
             fix = rule.get("fix_suggestion", "Review and fix this issue.")
             check = rule.get("check")
-            pattern = rule.get("pattern")
+            patterns = rule.get("_compiled")
 
             triggered = False
             line_number = None
@@ -62,7 +124,7 @@ class SecurityScanner:
             # --- Logic-based checks ---
             if check == "missing_nonroot_user":
                 # Triggered if no USER instruction at all, or only USER root
-                has_nonroot = re.search(r'^\s*USER\s+(?!root\s*$)\w+', content, re.MULTILINE)
+                has_nonroot = self.NONROOT_USER_RE.search(content)
                 if not has_nonroot:
                     triggered = True
 
@@ -71,9 +133,9 @@ class SecurityScanner:
                     triggered = True
 
             # --- Pattern-based checks ---
-            elif pattern:
-                for i, line in enumerate(content.splitlines(), start=1):
-                    if re.search(pattern, line, re.IGNORECASE):
+            elif patterns:
+                for i, line in enumerate(lines, start=1):
+                    if any(p.search(line) for p in patterns):
                         triggered = True
                         line_number = i
                         break
@@ -101,7 +163,7 @@ class SecurityScanner:
 
         lines = [f"⚠️  Risk Score: {score}/100\n"]
         for issue in issues:
-            icon = "🚨" if issue["severity"] == "CRITICAL" else ("⚠️" if issue["severity"] == "HIGH" else "💡")
+            icon = self.SEVERITY_ICONS.get(issue["severity"], "💡")
             line_info = f" (line {issue['line']})" if issue.get("line") else ""
             lines.append(f"{icon} [{issue['severity']}] {issue['rule_id']}{line_info}: {issue['message']}")
             lines.append(f"   Fix → {issue['fix']}")